@@ -1,4 +1,5 @@
 import os
+import hashlib
 import streamlit as st
 from dotenv import load_dotenv
 import json
@@ -6,16 +7,14 @@ import time
 from pathlib import Path
 from typing import Optional, Dict, Any
 import asyncio
-import logging
-
-# Configurer le logging
-logging.basicConfig(level=logging.INFO)
+import traceback
 
 # Importer les modules personnalisés
 from modules.scraper import WebScraper
-from modules.vector_store import VectorStore
+from modules.vector_store import VectorStore, scrape_documents
 from utils.config import load_config, save_config
 from utils.playwright_config import ensure_playwright_browsers
+from utils.scrape_cache import save_scrape_result, delete_scrape_results
 
 # S'assurer que les navigateurs Playwright sont installés
 ensure_playwright_browsers()
@@ -63,6 +62,9 @@ st.markdown("""
 
 # Initialisation de l'état de session
 def init_session_state():
+    # Déjà initialisé lors d'une exécution précédente du script
+    if st.session_state.get('_initialized'):
+        return
     if 'vector_store' not in st.session_state:
         st.session_state.vector_store = None
     if 'scraper' not in st.session_state:
@@ -75,59 +77,104 @@ def init_session_state():
         st.session_state.scrape_status = ""
     if 'search_history' not in st.session_state:
         st.session_state.search_history = []
+    st.session_state._initialized = True
 
 init_session_state()
 
+# Nombre de scrapings gardés en cache (seul leur résumé est en mémoire)
+SCRAPE_CACHE_MAX_ENTRIES = 32
+
+class NoPagesFound(Exception):
+    """Aucune page n'a pu être scrapée"""
+
+# Scraping mis en cache par (url, max_pages) pour éviter de re-scraper le même site
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=SCRAPE_CACHE_MAX_ENTRIES)
+def scrape_site(_scraper: WebScraper, _vector_store: VectorStore, url: str, max_pages: int):
+    """Scrape le site en chargeant les pages dans `_vector_store` au fil du scraping.
+
+    Les pages sont sauvegardées sur disque, dans un fichier propre à la clé du cache
+    (url, max_pages) et préfixé par le nom de la collection. Retourne le résumé du
+    scraping (sans les pages) avec le chemin de ce fichier: c'est tout ce que garde le cache.
+    """
+    result = _scraper.scrape_website(url, max_pages=max_pages, vector_store=_vector_store)
+    if not result or result.get('total_pages', 0) == 0:
+        # Une exception n'est pas mise en cache: un nouvel essai relancera le scraping
+        raise NoPagesFound(url)
+    summary = {key: value for key, value in result.items() if key != 'pages'}
+    cache_key = hashlib.blake2b(f"{url}|{max_pages}".encode("utf-8"), digest_size=8).hexdigest()
+    summary['path'] = save_scrape_result(
+        scrape_documents(result['pages']), summary, f"{_vector_store.collection.name}__{cache_key}"
+    )
+    return summary
+
 # Fonction pour scraper un site et charger dans le vector store
 def scrape_and_load(url: str, max_pages: int) -> Dict[str, Any]:
     print(f"\n=== DÉBUT DU SCRAPING ===")
     print(f"URL: {url}")
     print(f"Max pages: {max_pages}")
     
+    vector_store = None
+    
+    def discard_new_collection():
+        # Ne pas laisser de collection vide ou à moitié chargée, sans supprimer
+        # l'index d'un scraping précédent du même site
+        if vector_store is not None and vector_store.created:
+            try:
+                vector_store.delete_collection()
+            except Exception:
+                pass  # Erreur déjà journalisée par delete_collection
+    
     try:
         # Mettre à jour l'état du scraping
         st.session_state.scrape_status = "Démarrage du scraping..."
         st.session_state.scrape_progress = 5
         print("État de la session mis à jour")
         
+        # Une collection par site et par backend d'embedding: un nouveau scraping du même
+        # site y met à jour les documents, sans réembedder ceux qui n'ont pas changé
+        embedding_backend = config.get("embedding_backend", "openai")
+        domain = url.split('//')[-1].split('/')[0].replace('.', '_')
+        collection_name = f"{domain}_{embedding_backend}"
+            
+        # Initialiser le vector store avant le scraping, pour y charger les pages dès qu'elles sont prêtes
+        vector_store = VectorStore(
+            collection_name=collection_name,
+            api_key=st.session_state.openai_api_key if 'openai_api_key' in st.session_state else None,
+            embedding_backend=embedding_backend
+        )
+        
         # Récupérer les données
         print("Appel de scrape_website...")
-        result = st.session_state.scraper.scrape_website(url, max_pages=max_pages)
-        print("Scraping terminé, résultat:", bool(result))
-        
-        if not result or result.get('total_pages', 0) == 0:
+        try:
+            summary = scrape_site(st.session_state.scraper, vector_store, url, max_pages)
+            print("Scraping terminé, résultat:", bool(summary))
+        except NoPagesFound:
             print("Aucune page trouvée ou erreur lors du scraping")
+            discard_new_collection()
             st.session_state.scrape_status = "Échec : aucune page trouvée"
             st.session_state.scrape_progress = 0
             return None
             
         st.session_state.scrape_status = f"Scraping terminé. Création de la base vectorielle..."
         st.session_state.scrape_progress = 60
-            
-        # Créer un nom de collection unique basé sur l'URL
-        from datetime import datetime
-        domain = url.split('//')[-1].split('/')[0].replace('.', '_')
-        st.session_state.collection_name = f"{domain}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-            
-        # Initialiser le vector store
-        vector_store = VectorStore(
-            collection_name=st.session_state.collection_name,
-            api_key=st.session_state.openai_api_key if 'openai_api_key' in st.session_state else None
-        )
         
-        # Charger directement les données (sans passer par un fichier JSON)
-        vector_store.load_from_dict(result)
+        # Si le résultat venait du cache, les pages sont déjà embeddées dans la collection
+        # du site, qui vient d'être rouverte. Il ne faut les charger, depuis le fichier du
+        # scraping, que si elle est vide (supprimée depuis, ou autre backend d'embedding)
+        if vector_store.collection.count() == 0:
+            vector_store.load_from_dict(summary['path'])
         
         st.session_state.vector_store = vector_store
+        st.session_state.collection_name = collection_name
         st.session_state.scrape_status = "Terminé avec succès!"
         st.session_state.scrape_progress = 100
         print("=== SCRAPING RÉUSSI ===")
-        return result
+        return summary
     except Exception as e:
         error_msg = f"Erreur: {str(e)}"
         print(f"=== ERREUR: {error_msg}")
-        import traceback
         traceback.print_exc()
+        discard_new_collection()
         st.session_state.scrape_status = error_msg
         st.session_state.scrape_progress = 0
         return None
@@ -199,6 +246,9 @@ with st.sidebar:
             if st.button("Supprimer la collection actuelle"):
                 if st.session_state.vector_store:
                     st.session_state.vector_store.delete_collection()
+                    # Le scraping sauvegardé et les entrées du cache qui y renvoient
+                    delete_scrape_results(st.session_state.collection_name)
+                    scrape_site.clear()
                     st.session_state.vector_store = None
                     st.session_state.collection_name = None
                     st.success("Collection supprimée avec succès!")
@@ -213,8 +263,9 @@ st.markdown("<h1 class='main-title'>🔍 Assistant de Recherche Web</h1>", unsaf
 st.markdown("<p class='subtitle'>Posez des questions sur le contenu de n'importe quel site web</p>", 
             unsafe_allow_html=True)
 
-# Affichage principal
-if st.session_state.vector_store is not None:
+# Zone de recherche, réexécutée seule (fragment) lors des interactions avec ses widgets
+@st.fragment
+def search_panel():
     st.success("✅ Site web indexé ! Vous pouvez maintenant poser des questions.")
     
     # Afficher les informations sur les données chargées
@@ -240,55 +291,53 @@ if st.session_state.vector_store is not None:
     # Bouton de recherche
     if st.button("🔍 Rechercher", type="primary", use_container_width=True):
         if question.strip():
-            with st.spinner("Recherche en cours..."):
-                try:
-                    # Effectuer la recherche
-                    response = st.session_state.vector_store.rag_query(
-                        question, 
-                        n_results=n_results,
-                        threshold=threshold
-                    )
-                    
-                    # Ajouter à l'historique
-                    st.session_state.search_history.append({
-                        "question": question,
-                        "answer": response["answer"],
-                        "sources": response["sources"]
-                    })
-                    
-                    # Afficher la réponse
-                    st.markdown("### 📝 Réponse")
-                    st.markdown(response["answer"])
-                    
-                    # Afficher les sources
-                    if response.get("sources"):
-                        st.markdown("### 📚 Sources")
-                        for i, source in enumerate(response["sources"][:3], 1):  # Limiter à 3 sources
-                            with st.expander(f"Source {i}: {source.get('title', 'Sans titre')}"):
-                                st.write(f"**URL:** {source.get('url', 'N/A')}")
-                                st.write(f"**Pertinence:** {source.get('similarity', 0)*100:.1f}%")
-                                
-                                # Afficher un extrait du contenu
-                                if source.get('content'):
-                                    content = source['content']
-                                    if len(content) > 300:
-                                        content = content[:300] + "..."
-                                    st.write("**Extrait:**", content)
-                    
-                    # Ajouter système de feedback
-                    st.markdown("### 📝 Cette réponse vous a-t-elle été utile ?")
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        if st.button("👍 Oui", type="primary"):
-                            st.success("Merci pour votre retour positif !")
-                    with col2:
-                        if st.button("👎 Non"):
-                            feedback = st.text_area("Qu'est-ce qui pourrait être amélioré ?")
-                            if st.button("Envoyer"):
-                                st.success("Merci pour votre retour !")
-                    
-                except Exception as e:
-                    st.error(f"Une erreur est survenue : {str(e)}")
+            try:
+                # Rechercher les sources, puis afficher la réponse au fil de sa génération
+                with st.spinner("Recherche en cours..."):
+                    sources = st.session_state.vector_store.retrieve(question, n_results=n_results)
+                
+                st.markdown("### 📝 Réponse")
+                answer = st.write_stream(
+                    st.session_state.vector_store.rag_query_stream(question, n_results=n_results, sources=sources)
+                )
+                response = {"answer": answer, "sources": sources}
+                
+                # Ajouter à l'historique
+                st.session_state.search_history.append({
+                    "question": question,
+                    "answer": response["answer"],
+                    "sources": response["sources"]
+                })
+                
+                # Afficher les sources
+                if response.get("sources"):
+                    st.markdown("### 📚 Sources")
+                    for i, source in enumerate(response["sources"][:3], 1):  # Limiter à 3 sources
+                        with st.expander(f"Source {i}: {source.get('title', 'Sans titre')}"):
+                            st.write(f"**URL:** {source.get('url', 'N/A')}")
+                            st.write(f"**Pertinence:** {source.get('similarity', 0)*100:.1f}%")
+                            
+                            # Afficher un extrait du contenu
+                            if source.get('content'):
+                                content = source['content']
+                                if len(content) > 300:
+                                    content = content[:300] + "..."
+                                st.write("**Extrait:**", content)
+                
+                # Ajouter système de feedback
+                st.markdown("### 📝 Cette réponse vous a-t-elle été utile ?")
+                col1, col2 = st.columns(2)
+                with col1:
+                    if st.button("👍 Oui", type="primary"):
+                        st.success("Merci pour votre retour positif !")
+                with col2:
+                    if st.button("👎 Non"):
+                        feedback = st.text_area("Qu'est-ce qui pourrait être amélioré ?")
+                        if st.button("Envoyer"):
+                            st.success("Merci pour votre retour !")
+                
+            except Exception as e:
+                st.error(f"Une erreur est survenue : {str(e)}")
         else:
             st.warning("Veuillez entrer une question")
     
@@ -300,6 +349,9 @@ if st.session_state.vector_store is not None:
                 st.markdown(f"**Réponse:** {item['answer'][:150]}...")
                 st.markdown("---")
 
+# Affichage principal
+if st.session_state.vector_store is not None:
+    search_panel()
 else:
     # Afficher les instructions
     st.info("""
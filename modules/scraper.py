@@ -1,30 +1,196 @@
 import asyncio
 from playwright.async_api import async_playwright
-import requests
-import xmltodict
+import httpx
+import xml.etree.ElementTree as ET
+from io import BytesIO
 import re
+from collections import deque
+from contextlib import asynccontextmanager
 from datetime import datetime
+import orjson
 import logging
 from urllib.parse import urlparse
 from typing import Dict, Any, List, Optional
 
-# Configuration du logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('scraper.log'),
-        logging.StreamHandler()
-    ]
-)
+from utils.http_cache import HttpCache
+from utils.tokenizer import get_encoding
+
+# Configuration du logging (point unique de configuration de l'application,
+# sauf si l'hôte a déjà configuré ses propres handlers)
+if not logging.getLogger().handlers:
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('scraper.log'),
+            logging.StreamHandler()
+        ]
+    )
+
+# Nombre de pages scrapées avec une même instance de navigateur avant de la
+# relancer, pour borner la mémoire consommée par Chromium sur les longs crawls
+BROWSER_RECYCLE_EVERY = 20
+
+# Types de ressources inutiles à l'extraction du texte, bloquées au niveau du contexte
+BLOCKED_RESOURCE_TYPES = {'image', 'media', 'font'}
+
+# Extensions des liens ignorés lors de la découverte par crawling
+IGNORED_LINK_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.css', '.js', '.pdf', '.zip', '.tar')
+
+# Expression régulière de nettoyage des chunks, compilée une seule fois
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def _local_name(tag: str) -> str:
+    """Retire l'espace de noms d'une balise XML ('{ns}loc' -> 'loc')"""
+    return tag.rsplit('}', 1)[-1]
+
+def parse_sitemap(content: bytes):
+    """Analyse un sitemap XML en flux.
+
+    Retourne le type du sitemap ('urlset' ou 'sitemapindex') et un générateur
+    des URLs <loc> de ses entrées, chaque entrée étant libérée dès qu'elle a été lue.
+    """
+    events = ET.iterparse(BytesIO(content), events=('start', 'end'))
+    _, root = next(events)
+    sitemap_type = _local_name(root.tag)
+
+    def iter_locs():
+        # Profondeur 1: <url>/<sitemap>, profondeur 2: leur <loc> (on ignore
+        # ainsi les <image:loc> et autres extensions imbriquées plus bas)
+        depth = 1
+        for event, elem in events:
+            if event == 'start':
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 2 and _local_name(elem.tag) == 'loc' and elem.text:
+                yield elem.text.strip()
+            elif depth == 1:
+                elem.clear()
+
+    return sitemap_type, iter_locs()
+
+# Script d'extraction exécuté dans la page: titre, contenu principal (en évitant
+# les menus, footers, etc.) et métadonnées des balises meta
+EXTRACT_PAGE_JS = """
+    () => {
+        // Fonction pour détecter le contenu principal
+        function getMainContent() {
+            // Essayer de trouver le contenu principal par les balises sémantiques
+            const main = document.querySelector('main, article, [role="main"], .content, #content');
+            if (main) return main.innerText;
+            
+            // Sinon, exclure les parties communes de navigation
+            const body = document.body;
+            const elements = Array.from(body.querySelectorAll('nav, header, footer, aside, .menu, .sidebar, .navigation, #header, #footer, #menu, #nav'));
+            
+            // Supprimer temporairement ces éléments pour extraire le contenu
+            elements.forEach(el => {
+                if (el) el.style.display = 'none';
+            });
+            const content = body.innerText;
+            elements.forEach(el => {
+                if (el) el.style.display = '';
+            });
+            
+            return content;
+        }
+        
+        let content = getMainContent();
+        
+        // Si le contenu est vide, essayer une méthode alternative
+        if (!content || content.trim().length < 50) {
+            // Récupérer tous les paragraphes
+            const paragraphs = Array.from(document.querySelectorAll('p, h1, h2, h3, h4, h5, h6, li'));
+            content = paragraphs.map(p => p.innerText).join('\\n\\n');
+        }
+        
+        const metadata = {};
+        // Récupérer les métadonnées des balises meta
+        const metaTags = document.querySelectorAll('meta');
+        metaTags.forEach(meta => {
+            const name = meta.getAttribute('name') || meta.getAttribute('property');
+            const metaContent = meta.getAttribute('content');
+            if (name && metaContent) {
+                if (['description', 'keywords', 'author'].includes(name) ||
+                    name.startsWith('og:') || name.startsWith('twitter:')) {
+                    metadata[name] = metaContent;
+                }
+            }
+        });
+        
+        return {title: document.title, content: content, metadata: metadata};
+    }
+"""
+
+async def block_heavy_resources(route):
+    """Annule les requêtes vers les images, vidéos et polices"""
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+class RecyclingBrowser:
+    """Navigateur Chromium partagé, relancé après un nombre donné de pages.
+
+    Une fois que le navigateur courant a servi `recycle_every` pages, les pages suivantes
+    reçoivent un nouveau navigateur; l'ancien est fermé dès que ses pages en cours sont
+    terminées, sans interrompre les autres.
+    """
+
+    def __init__(self, playwright, recycle_every: int = BROWSER_RECYCLE_EVERY):
+        self.playwright = playwright
+        self.recycle_every = recycle_every
+        self._browser = None
+        self._served = 0
+        # Nombre de pages en cours par navigateur (courant ou en attente de fermeture)
+        self._in_flight = {}
+        self._lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def browser(self):
+        """Fournit le navigateur courant pour le temps du traitement d'une page"""
+        async with self._lock:
+            if self._browser is None or self._served >= self.recycle_every:
+                if self._browser is not None:
+                    logging.info("Recyclage du navigateur")
+                previous = self._browser
+                self._browser = await self.playwright.chromium.launch(headless=True)
+                self._served = 0
+                self._in_flight[self._browser] = 0
+                if previous is not None and self._in_flight[previous] == 0:
+                    await self._close(previous)
+            browser = self._browser
+            self._served += 1
+            self._in_flight[browser] += 1
+        try:
+            yield browser
+        finally:
+            self._in_flight[browser] -= 1
+            if browser is not self._browser and self._in_flight[browser] == 0:
+                await self._close(browser)
+
+    async def _close(self, browser):
+        del self._in_flight[browser]
+        await browser.close()
+
+    async def close(self):
+        """Ferme tous les navigateurs encore ouverts"""
+        for browser in list(self._in_flight):
+            await self._close(browser)
+        self._browser = None
 
 class WebScraper:
     def __init__(self, max_concurrent=5, chunk_size=500):
         self.max_concurrent = max_concurrent
         self.chunk_size = chunk_size
         
-    def scrape_website(self, url: str, max_pages: int = 50) -> Dict[str, Any]:
-        """Point d'entrée principal pour scraper un site web"""
+    def scrape_website(self, url: str, max_pages: int = 50, vector_store=None) -> Dict[str, Any]:
+        """Point d'entrée principal pour scraper un site web.
+
+        Si `vector_store` est fourni, chaque page y est chargée dès qu'elle est scrapée,
+        en parallèle du scraping des pages suivantes.
+        """
         try:
             logging.info(f"Début du scraping de {url} (max {max_pages} pages)")
             
@@ -47,18 +213,16 @@ class WebScraper:
             )
             
             # Exécuter le scraping de manière synchrone en appelant la fonction asynchrone
-            logging.info("Création de la boucle d'événements")
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+            # (asyncio.run ferme aussi proprement les générateurs asynchrones et l'exécuteur)
             try:
                 logging.info("Démarrage du scraping asynchrone")
-                result = loop.run_until_complete(scraper.scrape_all_pages(max_pages))
+                if vector_store is None:
+                    result = asyncio.run(scraper.scrape_all_pages(max_pages))
+                else:
+                    result = asyncio.run(self._scrape_and_load(scraper, max_pages, vector_store))
             except Exception as e:
                 logging.error(f"Erreur lors du scraping: {str(e)}", exc_info=True)
                 raise
-            finally:
-                logging.info("Nettoyage de la boucle d'événements")
-                loop.close()
             
             if result is None:
                 logging.warning("Aucun résultat n'a été retourné par le scraper")
@@ -78,16 +242,57 @@ class WebScraper:
             logging.error(f"Erreur critique dans scrape_website: {str(e)}", exc_info=True)
             raise
 
+    @staticmethod
+    async def _scrape_and_load(scraper, max_pages: int, vector_store) -> Optional[Dict[str, Any]]:
+        """Scrape le site en alimentant une file de pages consommée par le vector store"""
+        page_queue = asyncio.Queue()
+        
+        async def queued_pages():
+            while (page := await page_queue.get()) is not None:
+                yield page
+        
+        loader = asyncio.create_task(vector_store.aload_pages(queued_pages()))
+        scraping = asyncio.create_task(scraper.scrape_all_pages(max_pages, page_queue=page_queue))
+        try:
+            await asyncio.wait({loader, scraping}, return_when=asyncio.FIRST_COMPLETED)
+            if loader.done():
+                # Le chargement ne se termine avant le scraping qu'en cas d'erreur:
+                # inutile de continuer à scraper
+                scraping.cancel()
+                await loader
+            result = await scraping
+        except BaseException:
+            scraping.cancel()
+            loader.cancel()
+            raise
+        # Fin de la file: le chargement termine ses derniers lots
+        await page_queue.put(None)
+        doc_count = await loader
+        logging.info(f"{doc_count} documents chargés pendant le scraping")
+        return result
+
 class SiteContentScraper:
     def __init__(self, base_url=None, max_concurrent=5, chunk_size=500):
         self.base_url = base_url
         self.pages = []
+        # Ensemble parallèle à self.pages pour des tests d'appartenance en O(1)
+        self._pages_set = set()
         self.sitemap_url = f"{self.base_url}/sitemap.xml"
         self.max_concurrent = max_concurrent
         self.chunk_size = chunk_size
         parsed_url = urlparse(self.base_url)
         self.domain_name = parsed_url.netloc.replace('www.', '')
         self.progress_callback = None
+        self.http_cache = None
+        self.http_client = None
+
+    def _add_page(self, url) -> bool:
+        """Ajoute une URL du site à la liste des pages si elle n'y est pas déjà"""
+        if url.startswith(self.base_url) and url not in self._pages_set:
+            self._pages_set.add(url)
+            self.pages.append(url)
+            return True
+        return False
 
     def set_progress_callback(self, callback):
         """Définir une fonction de callback pour reporter la progression"""
@@ -97,52 +302,71 @@ class SiteContentScraper:
         """Reporter la progression si un callback est défini"""
         if self.progress_callback:
             self.progress_callback(status, progress)
-        logging.info(f"Progression: {progress:.1f}% - {status}")
+        logging.debug(f"Progression: {progress:.1f}% - {status}")
+
+    async def _conditional_get(self, url):
+        """GET conditionnel: si le serveur répond 304, le contenu est repris du cache HTTP"""
+        # Accès SQLite hors de la boucle d'événements: une base verrouillée ne bloque pas Playwright
+        entry = await asyncio.to_thread(self.http_cache.get, url)
+        response = await self.http_client.get(url, headers=HttpCache.validators(entry))
+        if response.status_code == 304 and entry:
+            logging.info(f"Contenu inchangé depuis le dernier scraping: {url}")
+            return 200, entry['body']
+        if response.status_code == 200:
+            await asyncio.to_thread(
+                self.http_cache.put, url, response.headers.get('etag'), response.headers.get('last-modified'), response.content
+            )
+        return response.status_code, response.content
+
+    async def _get_unchanged_page(self, url):
+        """Retourne la page extraite lors d'un précédent scraping si le serveur indique
+        qu'elle n'a pas changé (HEAD conditionnel avec réponse 304), sinon None"""
+        entry = await asyncio.to_thread(self.http_cache.get, url)
+        headers = HttpCache.validators(entry)
+        if not headers:
+            return None
+        try:
+            response = await self.http_client.head(url, headers=headers)
+        except httpx.HTTPError as e:
+            logging.debug(f"Revalidation impossible pour {url}: {str(e)}")
+            return None
+        if response.status_code != 304:
+            return None
+        return orjson.loads(entry['body'])
 
-    async def fetch_sitemap(self, max_pages=50):
+    async def fetch_sitemap(self, browser, max_pages=50):
         """Récupère le sitemap et extrait les URLs des pages"""
         try:
             self.report_progress("Recherche du sitemap...", 5)
             logging.info(f"Récupération du sitemap depuis {self.sitemap_url}")
-            response = requests.get(self.sitemap_url, timeout=10)
-            if response.status_code == 200:
-                # Nettoyer le contenu XML
-                content = response.content.decode('utf-8')
-                if '?>' in content:
-                    content = content.split('?>', 1)[1]
-                
+            status_code, content = await self._conditional_get(self.sitemap_url)
+            if status_code == 200:
                 try:
-                    sitemap = xmltodict.parse(content)
+                    sitemap_type, locs = parse_sitemap(content)
                     
                     # Si c'est un sitemap index, récupérer tous les sous-sitemaps
-                    if 'sitemapindex' in sitemap:
+                    if sitemap_type == 'sitemapindex':
                         self.report_progress("Traitement des sous-sitemaps...", 10)
-                        for sitemap_entry in sitemap['sitemapindex']['sitemap']:
-                            loc = sitemap_entry['loc']
-                            try:
-                                sub_response = requests.get(loc, timeout=10)
-                                if sub_response.status_code == 200:
-                                    sub_content = sub_response.content.decode('utf-8')
-                                    if '?>' in sub_content:
-                                        sub_content = sub_content.split('?>', 1)[1]
-                                    
-                                    sub_sitemap = xmltodict.parse(sub_content)
-                                    
-                                    # S'assurer que la structure attendue existe
-                                    if 'urlset' in sub_sitemap and 'url' in sub_sitemap['urlset']:
-                                        urls = sub_sitemap['urlset']['url']
-                                        # Gérer le cas où il n'y a qu'une seule URL
-                                        if not isinstance(urls, list):
-                                            urls = [urls]
-                                            
-                                        for url in urls:
-                                            loc = url['loc']
-                                            if loc.startswith(self.base_url) and loc not in self.pages:
-                                                self.pages.append(loc)
-                                                if len(self.pages) >= max_pages:
-                                                    break
-                            except Exception as e:
-                                logging.error(f"Erreur lors du traitement du sous-sitemap {loc}: {str(e)}")
+                        
+                        # Télécharger les sous-sitemaps en parallèle, au plus max_concurrent
+                        # à la fois, et les traiter dans l'ordre: seuls les contenus de la
+                        # fenêtre sont gardés en mémoire, et on s'arrête dès max_pages atteint
+                        pending = deque()
+                        try:
+                            for loc in locs:
+                                pending.append((loc, asyncio.create_task(self._conditional_get(loc))))
+                                if len(pending) >= self.max_concurrent:
+                                    await self._add_sub_sitemap_pages(*pending.popleft(), max_pages)
+                                if len(self.pages) >= max_pages:
+                                    break
+                            while pending and len(self.pages) < max_pages:
+                                await self._add_sub_sitemap_pages(*pending.popleft(), max_pages)
+                        finally:
+                            # Sous-sitemaps devenus inutiles: annuler leur téléchargement et
+                            # récupérer l'issue de ceux déjà terminés (exceptions comprises)
+                            for _, task in pending:
+                                task.cancel()
+                            await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
                         
                         logging.info(f"Trouvé {len(self.pages)} pages dans tous les sitemaps")
                         self.report_progress(f"Trouvé {len(self.pages)} pages", 15)
@@ -150,52 +374,59 @@ class SiteContentScraper:
                     else:
                         # Si c'est un sitemap normal, traiter directement
                         self.report_progress("Traitement du sitemap principal...", 10)
-                        if 'urlset' in sitemap and 'url' in sitemap['urlset']:
-                            urls = sitemap['urlset']['url']
-                            # Gérer le cas où il n'y a qu'une seule URL
-                            if not isinstance(urls, list):
-                                urls = [urls]
-                                
-                            for url in urls:
-                                loc = url['loc']
-                                if loc.startswith(self.base_url) and loc not in self.pages:
-                                    self.pages.append(loc)
-                                    if len(self.pages) >= max_pages:
-                                        break
-                            
-                            logging.info(f"Trouvé {len(self.pages)} pages dans le sitemap")
-                            self.report_progress(f"Trouvé {len(self.pages)} pages", 15)
-                            return len(self.pages) > 0
+                        for loc in locs:
+                            if self._add_page(loc):
+                                if len(self.pages) >= max_pages:
+                                    break
+                        
+                        logging.info(f"Trouvé {len(self.pages)} pages dans le sitemap")
+                        self.report_progress(f"Trouvé {len(self.pages)} pages", 15)
+                        return len(self.pages) > 0
                 except Exception as e:
                     logging.error(f"Erreur lors du parsing du sitemap: {str(e)}")
                     self.report_progress("Erreur avec le sitemap, tentative de crawling...", 5)
-                    return await self.discover_pages_via_crawling(self.base_url, max_pages)
+                    return await self.discover_pages_via_crawling(self.base_url, browser, max_pages)
                     
             else:
-                logging.warning(f"Pas de sitemap trouvé ({response.status_code}). Tentative de découverte par crawling...")
+                logging.warning(f"Pas de sitemap trouvé ({status_code}). Tentative de découverte par crawling...")
                 self.report_progress("Pas de sitemap, tentative de crawling...", 5)
-                return await self.discover_pages_via_crawling(self.base_url, max_pages)
+                return await self.discover_pages_via_crawling(self.base_url, browser, max_pages)
         except Exception as e:
             logging.error(f"Erreur lors de la récupération du sitemap: {str(e)}")
             logging.info("Tentative de découverte par crawling...")
             self.report_progress("Erreur, tentative de crawling...", 5)
-            return await self.discover_pages_via_crawling(self.base_url, max_pages)
+            return await self.discover_pages_via_crawling(self.base_url, browser, max_pages)
             
-    async def discover_pages_via_crawling(self, start_url, max_pages=50):
+    async def _add_sub_sitemap_pages(self, loc, fetch_task, max_pages):
+        """Ajoute les pages d'un sous-sitemap dont le téléchargement a été lancé"""
+        try:
+            sub_status_code, sub_content = await fetch_task
+            if sub_status_code == 200:
+                _, page_locs = parse_sitemap(sub_content)
+                for page_loc in page_locs:
+                    if self._add_page(page_loc):
+                        if len(self.pages) >= max_pages:
+                            break
+        except Exception as e:
+            logging.error(f"Erreur lors du traitement du sous-sitemap {loc}: {str(e)}")
+
+    async def discover_pages_via_crawling(self, start_url, browser, max_pages=50):
         """Découvre les pages en suivant les liens quand il n'y a pas de sitemap"""
         logging.info(f"Démarrage de la découverte via crawling depuis {start_url}")
         self.report_progress("Découverte de pages par crawling...", 10)
         self.pages = [start_url]
+        self._pages_set = {start_url}
         visited = set([start_url])
-        to_visit = [start_url]
+        to_visit = deque([start_url])
         
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
-            
+        context = await browser.new_context()
+        try:
+            await context.route("**/*", block_heavy_resources)
+            page = await context.new_page()
+
             page_count = 0
             while to_visit and len(visited) < max_pages:
-                current_url = to_visit.pop(0)
+                current_url = to_visit.popleft()
                 page_count += 1
                 
                 # Mise à jour de la progression
@@ -206,249 +437,193 @@ class SiteContentScraper:
                     logging.info(f"Visite de la page pour découverte: {current_url}")
                     await page.goto(current_url, wait_until="domcontentloaded", timeout=30000)
                     
-                    # Extraire tous les liens de la page
-                    links = await page.evaluate("""
-                        () => {
-                            return Array.from(document.querySelectorAll('a[href]'))
-                                .map(a => a.href)
-                                .filter(href => 
-                                    href.startsWith(window.location.origin) && 
-                                    !href.includes('#') && 
-                                    !href.match(/\.(jpg|jpeg|png|gif|css|js|pdf|zip|tar)$/i)
-                                );
-                        }
-                    """)
+                    # Extraire tous les liens de la page (le filtrage se fait côté Python)
+                    links = await page.evaluate(
+                        "() => Array.from(document.querySelectorAll('a[href]'), a => a.href)"
+                    )
+                    # Retirer les ancres et les fichiers non HTML, dédoublonner en gardant l'ordre
+                    urls = (link.split('#', 1)[0] for link in links)
+                    links = dict.fromkeys(u for u in urls if not u.lower().endswith(IGNORED_LINK_EXTENSIONS))
                     
                     # Ajouter les nouveaux liens à la liste à visiter
                     for link in links:
-                        if link not in visited and link.startswith(self.base_url):
+                        if link not in visited and self._add_page(link):
                             visited.add(link)
                             to_visit.append(link)
-                            self.pages.append(link)
                             if len(self.pages) >= max_pages:
                                 break
                 except Exception as e:
                     logging.error(f"Erreur lors de la découverte sur {current_url}: {str(e)}")
-            
-            await browser.close()
+        finally:
+            await context.close()
             
         logging.info(f"Découverte terminée: {len(self.pages)} pages trouvées")
         self.report_progress(f"Découverte terminée: {len(self.pages)} pages trouvées", 40)
         return len(self.pages) > 0
 
-    def chunk_text(self, text, overlap_percentage=0.2):
-        """Découpe le texte en chunks sémantiques avec chevauchement"""
+    def chunk_text(self, text, overlap_percentage=0.15):
+        """Découpe le texte en fenêtres glissantes de `chunk_size` tokens avec chevauchement"""
         if not text:
             return []
         
         # Nettoyer le texte
-        text = re.sub(r'\s+', ' ', text).strip()
-        
-        # Diviser par sections ou titres (approche sémantique)
-        # Recherche de patterns comme "Section X", "Chapitre X", titres numérotés, etc.
-        section_pattern = r'(?:\n|^)(?:#{1,6}|\d+\.|\*{1,3}|Section|Chapitre|Partie)\s+.+?(?=\n|$)'
-        sections = re.split(section_pattern, text)
+        text = _WHITESPACE_RE.sub(' ', text).strip()
         
-        # Fusionner les petites sections
-        merged_sections = []
-        current = ""
-        for section in sections:
-            if len(current) + len(section) < self.chunk_size:
-                current += section
-            else:
-                if current:
-                    merged_sections.append(current.strip())
-                current = section
-        if current:
-            merged_sections.append(current.strip())
+        # Compter en tokens (ceux du modèle d'embedding) plutôt qu'en caractères. Le texte
+        # d'une page peut contenir "<|endoftext|>": il est encodé comme du texte ordinaire
+        encoding = get_encoding()
+        tokens = encoding.encode(text, disallowed_special=())
+        step = max(1, int(self.chunk_size * (1 - overlap_percentage)))
         
-        # Appliquer chevauchement
         chunks = []
-        for i, section in enumerate(merged_sections):
-            # Si la section est trop grande, diviser en paragraphes
-            if len(section) > self.chunk_size:
-                paragraphs = section.split('\n\n')
-                current_chunk = ""
-                
-                for para in paragraphs:
-                    if len(current_chunk) + len(para) <= self.chunk_size:
-                        current_chunk += "\n\n" + para
-                    else:
-                        if current_chunk:
-                            chunks.append(current_chunk.strip())
-                            # Chevauchement: garder la dernière partie
-                            overlap_size = int(len(current_chunk) * overlap_percentage)
-                            current_chunk = current_chunk[-overlap_size:] + "\n\n" + para
-                        else:
-                            # Si un paragraphe est trop long, le diviser
-                            chunks.extend(self._split_long_paragraph(para, overlap_percentage))
-                
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-            else:
-                chunks.append(section)
+        for start in range(0, len(tokens), step):
+            chunks.append(encoding.decode(tokens[start:start + self.chunk_size]).strip())
+            # La dernière fenêtre atteint la fin du texte
+            if start + self.chunk_size >= len(tokens):
+                break
         
-        return [c for c in chunks if c.strip()]
+        return [c for c in chunks if c]
 
-    def _split_long_paragraph(self, paragraph, overlap_percentage=0.2):
-        """Divise un paragraphe long en chunks avec chevauchement"""
-        chunks = []
-        current = ""
-        sentences = re.split(r'(?<=[.!?])\s+', paragraph)
-        
-        for sentence in sentences:
-            if len(current) + len(sentence) <= self.chunk_size:
-                current += " " + sentence
-            else:
-                if current:
-                    chunks.append(current.strip())
-                    # Chevauchement
-                    overlap_size = int(len(current) * overlap_percentage)
-                    current = current[-overlap_size:] + " " + sentence
-                else:
-                    # Une phrase très longue
-                    chunks.append(sentence[:self.chunk_size])
-                    current = sentence[int(self.chunk_size * (1 - overlap_percentage)):]
-        
-        if current:
-            chunks.append(current.strip())
+    async def _build_page_result(self, url, title, content, metadata):
+        """Prépare les données structurées d'une page pour le RAG"""
+        # Découper le contenu en chunks pour le RAG, hors de la boucle d'événements
+        # pour ne pas bloquer les autres pages en cours de chargement
+        chunks = await asyncio.to_thread(self.chunk_text, content)
         
-        return chunks
+        return {
+            'url': url,
+            'title': title,
+            'content': content,
+            'chunks': chunks,
+            'chunk_count': len(chunks),
+            'metadata': {
+                'source': self.domain_name,
+                'last_modified': datetime.now().isoformat(),
+                'language': 'fr',  # Par défaut en français, à adapter si besoin
+                **metadata
+            }
+        }
 
-    async def scrape_page(self, url, index, total):
+    async def scrape_page(self, url, index, total, browser):
         """Scrape une page spécifique avec extraction optimisée pour RAG"""
         progress = 40 + (index / total) * 20
         self.report_progress(f"Scraping de la page {index+1}/{total}: {url}", progress)
         
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
-            
+        # Page inchangée depuis le dernier scraping: inutile de la rendre avec Chromium
+        cached = await self._get_unchanged_page(url)
+        if cached is not None:
+            logging.info(f"Page inchangée, reprise depuis le cache: {url}")
+            return await self._build_page_result(url, **cached)
+        
+        # Un contexte isolé par page, le navigateur étant partagé
+        context = await browser.new_context()
+        try:
+            await context.route("**/*", block_heavy_resources)
+            page = await context.new_page()
+
             try:
                 logging.info(f"Scraping de la page: {url}")
-                await page.goto(url, timeout=60000)
-                await page.wait_for_load_state('networkidle', timeout=30000)
-                
-                # Récupérer le titre
-                title = await page.title()
-                
-                # Récupérer le contenu principal en évitant les menus, footers, etc.
-                content = await page.evaluate("""
-                    () => {
-                        // Fonction pour détecter le contenu principal
-                        function getMainContent() {
-                            // Essayer de trouver le contenu principal par les balises sémantiques
-                            const main = document.querySelector('main, article, [role="main"], .content, #content');
-                            if (main) return main.innerText;
-                            
-                            // Sinon, exclure les parties communes de navigation
-                            const body = document.body;
-                            const elements = Array.from(body.querySelectorAll('nav, header, footer, aside, .menu, .sidebar, .navigation, #header, #footer, #menu, #nav'));
-                            
-                            // Supprimer temporairement ces éléments pour extraire le contenu
-                            elements.forEach(el => {
-                                if (el) el.style.display = 'none';
-                            });
-                            const content = body.innerText;
-                            elements.forEach(el => {
-                                if (el) el.style.display = '';
-                            });
-                            
-                            return content;
-                        }
-                        
-                        return getMainContent();
-                    }
-                """)
-                
-                # Si le contenu est vide, essayer une méthode alternative
-                if not content or len(content.strip()) < 50:
-                    content = await page.evaluate("""
-                        () => {
-                            // Récupérer tous les paragraphes
-                            const paragraphs = Array.from(document.querySelectorAll('p, h1, h2, h3, h4, h5, h6, li'));
-                            return paragraphs.map(p => p.innerText).join('\\n\\n');
-                        }
-                    """)
-                
-                # Extraire les métadonnées
-                metadata = await page.evaluate("""
-                    () => {
-                        const metadata = {};
-                        // Récupérer les métadonnées des balises meta
-                        const metaTags = document.querySelectorAll('meta');
-                        metaTags.forEach(meta => {
-                            const name = meta.getAttribute('name') || meta.getAttribute('property');
-                            const content = meta.getAttribute('content');
-                            if (name && content) {
-                                if (['description', 'keywords', 'author'].includes(name) ||
-                                    name.startsWith('og:') || name.startsWith('twitter:')) {
-                                    metadata[name] = content;
-                                }
-                            }
-                        });
-                        return metadata;
-                    }
-                """)
+                response = await page.goto(url, wait_until="domcontentloaded", timeout=20000)
+                try:
+                    # Attendre le contenu principal plutôt que la fin de toute activité réseau
+                    await page.wait_for_selector('main, article, [role="main"]', timeout=3000)
+                except Exception:
+                    # Pas de balise sémantique à temps: laisser au moins les scripts de la page
+                    # s'exécuter (pages rendues en JavaScript)
+                    logging.debug(f"Contenu principal non détecté à temps pour {url}")
+                    try:
+                        await page.wait_for_load_state("load", timeout=5000)
+                    except Exception:
+                        logging.debug(f"Chargement incomplet de {url}, extraction en l'état")
                 
-                # Fermer le navigateur
-                await browser.close()
+                # Titre, contenu principal et métadonnées en un seul aller-retour avec le navigateur
+                extracted = await page.evaluate(EXTRACT_PAGE_JS)
+                title = extracted['title']
+                content = extracted['content']
+                metadata = extracted['metadata']
                 
-                # Découper le contenu en chunks pour le RAG
-                chunks = self.chunk_text(content)
+                # Mémoriser l'extraction avec les validateurs HTTP de la page
+                if response is not None:
+                    await asyncio.to_thread(
+                        self.http_cache.put,
+                        url,
+                        response.headers.get('etag'),
+                        response.headers.get('last-modified'),
+                        orjson.dumps({'title': title, 'content': content, 'metadata': metadata})
+                    )
                 
-                # Préparer les données structurées pour le RAG
-                result = {
-                    'url': url,
-                    'title': title,
-                    'content': content,
-                    'chunks': chunks,
-                    'chunk_count': len(chunks),
-                    'metadata': {
-                        'source': self.domain_name,
-                        'last_modified': datetime.now().isoformat(),
-                        'language': 'fr',  # Par défaut en français, à adapter si besoin
-                        **metadata
-                    }
-                }
+                result = await self._build_page_result(url, title, content, metadata)
+                chunks = result['chunks']
                 
                 logging.info(f"Scraping réussi pour {url}: {len(chunks)} chunks extraits")
                 return result
                 
             except Exception as e:
                 logging.error(f"Erreur lors du scraping de {url}: {str(e)}")
-                await browser.close()
                 return None
+        finally:
+            await context.close()
+
+    async def scrape_all_pages(self, max_pages=50, page_queue: Optional[asyncio.Queue] = None):
+        """Scrape toutes les pages et retourne les données structurées.
 
-    async def scrape_all_pages(self, max_pages=50):
-        """Scrape toutes les pages et retourne les données structurées"""
+        Si `page_queue` est fournie, chaque page réussie y est déposée dès qu'elle est prête.
+        """
         self.report_progress("Démarrage du processus de scraping...", 0)
         
-        if not await self.fetch_sitemap(max_pages):
-            logging.error(f"Impossible de trouver des pages à scraper pour {self.base_url}")
-            self.report_progress("Échec: aucune page trouvée", 0)
-            return None
-        
-        # Limiter le nombre de pages à scraper
-        if len(self.pages) > max_pages:
-            self.pages = self.pages[:max_pages]
-            logging.info(f"Limitation à {max_pages} pages")
-        
-        self.report_progress(f"Préparation du scraping de {len(self.pages)} pages...", 40)
+        async with async_playwright() as p, httpx.AsyncClient(timeout=10, follow_redirects=True, http2=True) as client:
+            self.http_client = client
+            self.http_cache = None
+            # Un même navigateur pour la découverte et le scraping, relancé périodiquement
+            browsers = RecyclingBrowser(p)
+            try:
+                # Cache des validateurs HTTP, pour ne pas retraiter ce qui n'a pas changé
+                self.http_cache = HttpCache()
+                
+                async with browsers.browser() as browser:
+                    found = await self.fetch_sitemap(browser, max_pages)
+                if not found:
+                    logging.error(f"Impossible de trouver des pages à scraper pour {self.base_url}")
+                    self.report_progress("Échec: aucune page trouvée", 0)
+                    return None
+                
+                # Limiter le nombre de pages à scraper
+                if len(self.pages) > max_pages:
+                    self.pages = self.pages[:max_pages]
+                    logging.info(f"Limitation à {max_pages} pages")
+                
+                self.report_progress(f"Préparation du scraping de {len(self.pages)} pages...", 40)
 
-        # Semaphore pour limiter le nombre de requêtes concurrentes
-        semaphore = asyncio.Semaphore(self.max_concurrent)
-        
-        async def bounded_scrape(url, index, total):
-            async with semaphore:
-                return await self.scrape_page(url, index, total)
-        
-        # Lancer toutes les tâches en parallèle
-        tasks = [bounded_scrape(url, i, len(self.pages)) for i, url in enumerate(self.pages)]
-        all_results = await asyncio.gather(*tasks)
-        
-        # Filtrer les résultats réussis
-        successful_results = [result for result in all_results if result]
+                # Semaphore pour limiter le nombre de requêtes concurrentes
+                semaphore = asyncio.Semaphore(self.max_concurrent)
+                
+                async def bounded_scrape(url, index, total):
+                    async with semaphore:
+                        async with browsers.browser() as browser:
+                            result = await self.scrape_page(url, index, total, browser)
+                    if result and page_queue is not None:
+                        await page_queue.put(result)
+                    return result
+                
+                # Lancer toutes les tâches en parallèle: le recyclage du navigateur
+                # n'attend pas la fin des pages en cours
+                total = len(self.pages)
+                tasks = [bounded_scrape(url, i, total) for i, url in enumerate(self.pages)]
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+                
+                # Une exception sur une page n'interrompt pas les autres
+                successful_results = []
+                total_chunks = 0
+                for url, result in zip(self.pages, results):
+                    if isinstance(result, Exception):
+                        logging.error(f"Erreur inattendue lors du scraping de {url}: {str(result)}")
+                    elif result:
+                        successful_results.append(result)
+                        total_chunks += result['chunk_count']
+            finally:
+                await browsers.close()
+                if self.http_cache is not None:
+                    self.http_cache.close()
         
         self.report_progress("Assemblage des données...", 90)
         
@@ -458,7 +633,7 @@ class SiteContentScraper:
             'domain_name': self.domain_name,
             'total_pages': len(successful_results),
             'timestamp': datetime.now().isoformat(),
-            'total_chunks': sum(page['chunk_count'] for page in successful_results),
+            'total_chunks': total_chunks,
             'pages': successful_results
         }
         
@@ -467,10 +642,14 @@ class SiteContentScraper:
         
         return master_json
 
-# Pour tester le scraper individuellement
+# Pour tester le scraper individuellement, depuis la racine du dépôt:
+#   python -m modules.scraper https://exemple.com
 if __name__ == "__main__":
-    scraper = WebScraper(max_concurrent=5)
     import sys
+    from modules.vector_store import scrape_documents
+    from utils.scrape_cache import save_scrape_result
+    
+    scraper = WebScraper(max_concurrent=5)
     
     if len(sys.argv) > 1:
         url = sys.argv[1]
@@ -484,4 +663,10 @@ if __name__ == "__main__":
     
     # Afficher les titres des pages scrapées
     for i, page in enumerate(result['pages']):
-        print(f"{i+1}. {page['title']} ({page['chunk_count']} chunks)")
\ No newline at end of file
+        print(f"{i+1}. {page['title']} ({page['chunk_count']} chunks)")
+    
+    # Sauvegarder le résultat, pour l'indexer plus tard avec VectorStore.load_from_dict(chemin)
+    if result['pages']:
+        header = {key: value for key, value in result.items() if key != 'pages'}
+        path = save_scrape_result(scrape_documents(result['pages']), header, result['domain_name'].replace('.', '_'))
+        print(f"Résultat sauvegardé dans {path}")
\ No newline at end of file
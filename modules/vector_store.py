@@ -1,5 +1,9 @@
 import os
 import json
+import asyncio
+import hashlib
+from collections import deque, OrderedDict
+from contextlib import AsyncExitStack
 
 # Fix SQLite version issue on Streamlit Cloud
 import sys
@@ -11,187 +15,517 @@ if importlib.util.find_spec("pysqlite3") is not None:
 
 import chromadb
 from chromadb.config import Settings
-from openai import OpenAI
-from typing import List, Dict, Any, Optional
-import tiktoken
+from openai import OpenAI, AsyncOpenAI
+from typing import List, Dict, Any, Optional, Union, Iterator, AsyncIterator, Tuple
 import logging
 import httpx
 
-# Ajout de l'adaptateur pour ChromaDB ≥ 0.4.16
-class EmbeddingFunctionAdapter:
-    def __init__(self, embedding_function):
-        self.embedding_function = embedding_function
+import numpy as np
+import pyarrow as pa
+
+from utils.scrape_cache import load_scrape_table
+from utils.tokenizer import get_encoding
+
+logger = logging.getLogger(__name__)
+
+# Paramètres de l'index HNSW des collections ChromaDB: graphe de degré M=16 et
+# construction plus soignée que la valeur par défaut (100) pour un meilleur rappel
+HNSW_PARAMS = {
+    "hnsw:M": 16,
+    "hnsw:construction_ef": 200,
+}
+
+# Taille des vecteurs demandée à text-embedding-3-large (3072 par défaut). Les modèles
+# text-embedding-3 produisent des vecteurs tronquables: 1024 dimensions divisent par 3
+# la mémoire de l'index et le coût des produits scalaires pour une perte de qualité minime
+OPENAI_EMBEDDING_DIMENSIONS = 1024
+
+# Limites d'un lot d'embedding lors de l'indexation: nombre de documents et total
+# de tokens par requête (l'API OpenAI plafonne à 300 000 tokens par requête)
+EMBED_BATCH_MAX_INPUTS = 256
+EMBED_BATCH_MAX_TOKENS = 280_000
+# Longueur maximale d'un document embeddé (le modèle accepte 8191 tokens par entrée)
+EMBED_MAX_INPUT_TOKENS = 8000
+# Nombre maximal de lots embeddés simultanément par l'API OpenAI (un modèle local
+# n'embedde qu'un lot à la fois: plusieurs appels simultanés se disputeraient le CPU/GPU)
+EMBED_MAX_IN_FLIGHT = 5
+# Nombre d'embeddings de questions gardés en mémoire (LRU)
+QUERY_EMBEDDING_CACHE_SIZE = 128
+
+# Pool de connexions HTTP/2 partagé par les clients OpenAI: les requêtes suivantes
+# réutilisent la connexion TLS ouverte au lieu de refaire une poignée de main
+HTTP_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60.0)
+HTTP_TIMEOUT = httpx.Timeout(30.0)
+_http_client = None
+
+def _shared_http_client() -> httpx.Client:
+    """Client HTTP synchrone commun à tous les clients OpenAI du processus"""
+    global _http_client
+    if _http_client is None:
+        # proxy=None explicitement pour ignorer les proxys de l'environnement
+        _http_client = httpx.Client(
+            transport=httpx.HTTPTransport(proxy=None, http2=True, limits=HTTP_LIMITS),
+            timeout=HTTP_TIMEOUT
+        )
+    return _http_client
+
+# Modèles d'embedding locaux déjà chargés, partagés entre les instances
+_local_models = {}
+
+# Part de la fenêtre d'un modèle local utilisée pour découper les documents: elle est
+# comptée en tokens cl100k_base, plus gros en moyenne que ceux des modèles multilingues
+LOCAL_MODEL_WINDOW_RATIO = 0.8
+
+class LocalEmbedding:
+    """Fonction d'embedding locale (sentence-transformers), exécutée sur GPU si disponible"""
+    
+    def __init__(self, model_name: str = "intfloat/multilingual-e5-small", batch_size: int = 256):
+        if importlib.util.find_spec("sentence_transformers") is None:
+            raise ValueError("Le backend d'embedding local nécessite le paquet sentence-transformers")
+        if model_name not in _local_models:
+            import torch
+            from sentence_transformers import SentenceTransformer
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            logger.info(f"Chargement du modèle d'embedding local {model_name} ({device})...")
+            _local_models[model_name] = SentenceTransformer(model_name, device=device)
+        self.model = _local_models[model_name]
+        self.batch_size = batch_size
+        # Le modèle tronque ses entrées à max_seq_length tokens: les documents plus longs
+        # sont découpés en conséquence avant l'embedding
+        self.max_input_tokens = int(self.model.max_seq_length * LOCAL_MODEL_WINDOW_RATIO)
     
+    async def aembed(self, texts, aclient=None):
+        # Calcul local: exécuté dans un thread pour ne pas bloquer la boucle d'événements
+        return await asyncio.to_thread(self, texts)
+    
+    @staticmethod
+    def name():
+        return "sentence-transformers"
+    
+    # Signature attendue par ChromaDB ≥ 0.4.16: __call__(self, input)
     def __call__(self, input):
-        # Convertit 'input' en 'texts' pour l'ancienne interface
-        return self.embedding_function(texts=input)
+        truncated = sum(
+            len(ids) > self.model.max_seq_length
+            for ids in self.model.tokenizer(list(input))['input_ids']
+        )
+        if truncated:
+            logger.warning(
+                f"{truncated} textes tronqués à {self.model.max_seq_length} tokens par le modèle d'embedding local"
+            )
+        embeddings = self.model.encode(
+            input,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+        return embeddings.tolist()
+
+class StaticEmbedding:
+    """Fonction d'embedding statique (model2vec): quelques microsecondes par texte sur CPU,
+    sans appel réseau, aussi bien pour l'indexation que pour les questions"""
+    
+    def __init__(self, model_name: str = "minishlab/potion-retrieval-32M"):
+        if importlib.util.find_spec("model2vec") is None:
+            raise ValueError("Le backend d'embedding statique nécessite le paquet model2vec")
+        if model_name not in _local_models:
+            from model2vec import StaticModel
+            logger.info(f"Chargement du modèle d'embedding statique {model_name}...")
+            _local_models[model_name] = StaticModel.from_pretrained(model_name)
+        self.model = _local_models[model_name]
+    
+    async def aembed(self, texts, aclient=None):
+        return await asyncio.to_thread(self, texts)
+    
+    @staticmethod
+    def name():
+        return "model2vec"
+    
+    def __call__(self, input):
+        return self.model.encode(input).tolist()
+
+def _document_id(url: str, document: str) -> str:
+    """Identifiant déterministe d'un document, dérivé de son URL et de son contenu"""
+    return hashlib.blake2b(f"{url}|{document}".encode("utf-8"), digest_size=16).hexdigest()
+
+# Au-delà de cette longueur, une page est indexée par ses chunks plutôt qu'en entier
+CHUNKED_CONTENT_MIN_CHARS = 5000  # Seuil arbitraire, à ajuster
+
+def chunked_pages_mask(pages: List[Dict[str, Any]]) -> np.ndarray:
+    """Masque des pages à indexer par chunks, calculé en une comparaison vectorisée"""
+    lengths = np.fromiter((len(page.get('content', '')) for page in pages), dtype=np.int64, count=len(pages))
+    return lengths > CHUNKED_CONTENT_MIN_CHARS
+
+def page_documents(page: Dict[str, Any], chunked: Optional[bool] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Documents à indexer pour une page (texte, métadonnées), sans les textes vides.
+
+    `chunked` peut être fourni s'il a déjà été calculé avec `chunked_pages_mask`.
+    """
+    if chunked is None:
+        chunked = len(page.get('content', '')) > CHUNKED_CONTENT_MIN_CHARS
+    
+    # Si le contenu est trop grand, utiliser les chunks préexistants
+    if chunked:
+        for j, chunk in enumerate(page.get('chunks', [])):
+            if not chunk.strip():
+                continue
+            yield chunk, {
+                'url': page.get('url', ''),
+                'title': page.get('title', ''),
+                'chunk_id': j,
+                'is_chunk': True
+            }
+    elif (page.get('content') or '').strip():
+        # Sinon, utiliser le contenu entier (l'API d'embedding refuse les textes vides)
+        yield page['content'], {
+            'url': page.get('url', ''),
+            'title': page.get('title', ''),
+            'is_chunk': False
+        }
+
+def scrape_documents(pages: List[Dict[str, Any]]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Documents à indexer (texte, métadonnées) de toutes les pages d'un scraping"""
+    for page, chunked in zip(pages, chunked_pages_mask(pages)):
+        yield from page_documents(page, bool(chunked))
+
+# Groupe de documents à indexer (texte, métadonnées), tokenisés ensemble
+DocumentGroup = List[Tuple[str, Dict[str, Any]]]
+
+async def _apage_documents(pages: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[DocumentGroup]:
+    """Documents à indexer des pages reçues, groupés par page"""
+    async for page in pages:
+        yield list(page_documents(page))
 
 class VectorStore:
-    def __init__(self, collection_name: str = "web_docs", api_key: str = None):
+    def __init__(self, collection_name: str = "web_docs", api_key: str = None, embedding_backend: str = "openai"):
         # Initialiser le client OpenAI
         openai_api_key = api_key or os.getenv("OPENAI_API_KEY")
         if not openai_api_key:
             raise ValueError("La clé API OpenAI n'est pas définie")
         
+        self.api_key = openai_api_key
+        
         # Configuration du logger
-        self.logger = logging.getLogger(__name__)
+        self.logger = logger
         
         # Initialisation du client OpenAI avec gestion des proxies
-        print("Initialisation du client OpenAI...")
+        logger.info("Initialisation du client OpenAI...")
         try:
-            # Créer un client HTTP personnalisé avec proxies=None explicitement
-            transport = httpx.HTTPTransport(proxy=None)
-            http_client = httpx.Client(transport=transport)
-            
-            # Utiliser ce client HTTP personnalisé avec OpenAI
+            # Utiliser le client HTTP partagé (HTTP/2, connexions persistantes) avec OpenAI
             self.openai_client = OpenAI(
                 api_key=openai_api_key,
-                http_client=http_client
+                http_client=_shared_http_client()
             )
-            print("Client OpenAI initialisé avec succès")
+            logger.info("Client OpenAI initialisé avec succès")
             
             # Initialiser ChromaDB
-            print("Initialisation de ChromaDB...")
+            logger.info("Initialisation de ChromaDB...")
             # Utiliser un chemin relatif pour être compatible avec différents environnements
             chroma_path = os.path.join(os.getcwd(), "chroma_db")
-            print(f"Chemin ChromaDB: {chroma_path}")
+            logger.info(f"Chemin ChromaDB: {chroma_path}")
             self.chroma_client = chromadb.PersistentClient(path=chroma_path)
-            print("Client ChromaDB initialisé avec succès")
-            
-            # Créer un client HTTP personnalisé pour les embeddings
-            transport_embed = httpx.HTTPTransport(proxy=None)
-            http_client_embed = httpx.Client(transport=transport_embed)
+            logger.info("Client ChromaDB initialisé avec succès")
             
             # Définir une fonction d'embedding personnalisée pour contourner le problème de proxy
             class CustomOpenAIEmbedding:
-                def __init__(self, api_key, model_name):
+                def __init__(self, api_key, model_name, dimensions=None):
                     self.client = OpenAI(
                         api_key=api_key,
-                        http_client=http_client_embed
+                        http_client=_shared_http_client()
                     )
                     self.model_name = model_name
+                    self.dimensions = dimensions
                 
-                def __call__(self, texts):
+                @staticmethod
+                def name():
+                    return "openai-text-embedding-3-large"
+                
+                # Signature attendue par ChromaDB ≥ 0.4.16: __call__(self, input)
+                def __call__(self, input):
                     response = self.client.embeddings.create(
                         model=self.model_name,
-                        input=texts
+                        input=input,
+                        dimensions=self.dimensions
+                    )
+                    return [item.embedding for item in response.data]
+                
+                async def aembed(self, texts, aclient):
+                    response = await aclient.embeddings.create(
+                        model=self.model_name,
+                        input=texts,
+                        dimensions=self.dimensions
                     )
                     return [item.embedding for item in response.data]
             
-            # Utiliser notre fonction d'embedding personnalisée avec le modèle amélioré
-            self.openai_ef = CustomOpenAIEmbedding(
-                api_key=openai_api_key,
-                model_name="text-embedding-3-large"
-            )
-            
-            # Créer l'adaptateur pour rendre compatible avec ChromaDB ≥ 0.4.16
-            self.embedding_adapter = EmbeddingFunctionAdapter(self.openai_ef)
+            if embedding_backend == "local":
+                # Embeddings calculés localement, sans appel réseau
+                self.embedding_function = LocalEmbedding()
+            elif embedding_backend == "static":
+                # Embeddings statiques, quasi instantanés: la question n'attend plus l'API
+                self.embedding_function = StaticEmbedding()
+            elif embedding_backend == "openai":
+                # Utiliser notre fonction d'embedding personnalisée avec le modèle amélioré
+                self.embedding_function = CustomOpenAIEmbedding(
+                    api_key=openai_api_key,
+                    model_name="text-embedding-3-large",
+                    dimensions=OPENAI_EMBEDDING_DIMENSIONS
+                )
+            else:
+                raise ValueError(f"Backend d'embedding inconnu: {embedding_backend}")
+            # Seul le backend OpenAI fait des appels réseau lors de l'indexation
+            self._embeds_remotely = embedding_backend == "openai"
             
-            # Créer ou récupérer la collection avec l'adaptateur
+            # Créer ou récupérer la collection avec la fonction d'embedding, indexée par HNSW
+            # (recherche approximative en temps sous-linéaire). `created` indique qu'elle
+            # n'existait pas encore, pour ne supprimer en cas d'échec que ce qui vient d'être créé
+            self.created = not self.has_collection(collection_name)
             self.collection = self.chroma_client.get_or_create_collection(
                 name=collection_name,
-                embedding_function=self.embedding_adapter
+                embedding_function=self.embedding_function,
+                metadata=HNSW_PARAMS
             )
             
-            self.tokenizer = tiktoken.get_encoding("cl100k_base")
+            self.tokenizer = get_encoding()
+            # Longueur maximale d'un document embeddé, plus courte pour un modèle local
+            self.max_input_tokens = getattr(self.embedding_function, 'max_input_tokens', EMBED_MAX_INPUT_TOKENS)
+            
+            # Embeddings des dernières questions, pour ne pas rappeler l'API sur une question répétée
+            self._query_embeddings = OrderedDict()
             
         except Exception as e:
             error_msg = f"Erreur lors de l'initialisation: {str(e)}"
-            print(error_msg)
-            self.logger.error(error_msg)
+            logger.error(error_msg)
             raise Exception(error_msg) from e
 
-    def load_from_dict(self, data: Dict[str, Any]):
-        """Charge les données depuis un dictionnaire dans le vector store."""
-        print(f"Chargement de {len(data.get('pages', []))} pages dans le vector store...")
+    def load_from_dict(self, data: Union[Dict[str, Any], str], batch_size: int = EMBED_BATCH_MAX_INPUTS):
+        """Charge les données depuis un dictionnaire dans le vector store.
+
+        `data` peut aussi être le chemin d'un scraping sauvegardé avec
+        `save_scrape_result`: la table des documents est alors lue depuis le disque.
+        Les documents sont regroupés en lots d'au plus `batch_size` documents et
+        EMBED_BATCH_MAX_TOKENS tokens; jusqu'à EMBED_MAX_IN_FLIGHT lots sont embeddés
+        en parallèle, puis ajoutés à la collection dans l'ordre avec leurs embeddings.
+        """
+        if isinstance(data, (str, os.PathLike)):
+            self.load_from_arrow(load_scrape_table(data), batch_size)
+            return
+        pages = data.get('pages', [])
+        logger.info(f"Chargement de {len(pages)} pages dans le vector store...")
+        
+        # Choix chunks / contenu entier pour toutes les pages en une seule comparaison
+        async def documents():
+            for page, chunked in zip(pages, chunked_pages_mask(pages)):
+                yield list(page_documents(page, bool(chunked)))
+        
+        self._load_documents(documents(), batch_size)
+
+    def load_from_arrow(self, table: pa.Table, batch_size: int = EMBED_BATCH_MAX_INPUTS):
+        """Charge une table de documents (colonnes url, title, chunk_id, text), telle que
+        sauvegardée par `save_scrape_result`, en la parcourant colonne par colonne."""
+        logger.info(f"Chargement de {table.num_rows} documents dans le vector store...")
+        
+        async def documents():
+            # Lecture par blocs d'enregistrements: seules les colonnes du bloc courant
+            # sont converties en objets Python
+            for record_batch in table.to_batches(max_chunksize=batch_size):
+                columns = [record_batch.column(name).to_pylist() for name in ('url', 'title', 'chunk_id', 'text')]
+                group = []
+                for url, title, chunk_id, text in zip(*columns):
+                    metadata = {'url': url, 'title': title, 'is_chunk': chunk_id is not None}
+                    if chunk_id is not None:
+                        metadata['chunk_id'] = chunk_id
+                    group.append((text, metadata))
+                yield group
         
+        self._load_documents(documents(), batch_size)
+
+    def _load_documents(self, documents: AsyncIterator[DocumentGroup], batch_size: int):
         try:
-            documents = []
-            metadatas = []
-            ids = []
-            doc_id_counter = 0
-            
-            for i, page in enumerate(data.get('pages', [])):
-                content = page.get('content', '')
-                
-                # Si le contenu est trop grand, utiliser les chunks préexistants
-                if len(content) > 5000:  # Seuil arbitraire, à ajuster
-                    chunks = page.get('chunks', [])
-                    for j, chunk in enumerate(chunks):
-                        doc_id = f"doc_{doc_id_counter}"
-                        doc_id_counter += 1
-                        documents.append(chunk)
-                        metadatas.append({
-                            'url': page.get('url', ''),
-                            'title': page.get('title', ''),
-                            'chunk_id': j,
-                            'is_chunk': True
-                        })
-                        ids.append(doc_id)
-                else:
-                    # Sinon, utiliser le contenu entier
-                    doc_id = f"doc_{doc_id_counter}"
-                    doc_id_counter += 1
-                    documents.append(content)
-                    metadatas.append({
-                        'url': page.get('url', ''),
-                        'title': page.get('title', ''),
-                        'is_chunk': False
-                    })
-                    ids.append(doc_id)
-            
-            # Traiter les documents par lots pour éviter les dépassements de limite
-            batch_size = 20  # Ajustez selon vos besoins
-            for i in range(0, len(documents), batch_size):
-                batch_docs = documents[i:i+batch_size]
-                batch_meta = metadatas[i:i+batch_size]
-                batch_ids = ids[i:i+batch_size]
-                
-                # Ajouter le lot à la collection
-                self.collection.add(
-                    documents=batch_docs,
-                    metadatas=batch_meta,
-                    ids=batch_ids
-                )
-                print(f"Lot {i//batch_size + 1}/{(len(documents) + batch_size - 1)//batch_size} chargé")
-            
-            print(f"{len(documents)} documents chargés avec succès")
+            doc_count = asyncio.run(self._aload_documents(documents, batch_size))
+            logger.info(f"{doc_count} documents chargés avec succès")
             
         except Exception as e:
             error_msg = f"Erreur lors du chargement des données: {str(e)}"
-            print(error_msg)
+            logger.error(error_msg)
             raise Exception(error_msg) from e
 
+    async def _iter_batches(self, groups: AsyncIterator[DocumentGroup], batch_size: int, seen_ids: set, seen_urls: set, offload: bool):
+        """Regroupe les documents en lots (documents, metadatas, ids, tokens par document).
+
+        `seen_ids` reçoit les identifiants de tous les documents produits (un document
+        répété n'est embeddé qu'une fois) et `seen_urls` les URLs de leurs pages. Si `offload` est vrai, chaque groupe est tokenisé
+        dans un thread, pour ne pas bloquer une boucle d'événements partagée.
+        """
+        documents = []
+        metadatas = []
+        ids = []
+        token_counts = []
+        batch_tokens = 0
+        
+        def add_document(metadata, parts):
+            """Ajoute les parties d'un document au lot courant et retourne les lots complets"""
+            nonlocal documents, metadatas, ids, token_counts, batch_tokens
+            batches = []
+            seen_urls.add(metadata['url'])
+            for part, n_tokens in parts:
+                doc_id = _document_id(metadata['url'], part)
+                if doc_id in seen_ids:
+                    continue
+                seen_ids.add(doc_id)
+                # Lot plein (en nombre de documents ou en tokens): le fermer avant d'ajouter
+                if documents and (len(documents) >= batch_size or batch_tokens + n_tokens > EMBED_BATCH_MAX_TOKENS):
+                    batches.append((documents, metadatas, ids, token_counts))
+                    documents, metadatas, ids, token_counts, batch_tokens = [], [], [], [], 0
+                documents.append(part)
+                metadatas.append(metadata)
+                ids.append(doc_id)
+                token_counts.append(n_tokens)
+                batch_tokens += n_tokens
+            return batches
+        
+        async for group in groups:
+            texts = [document for document, _ in group]
+            if offload:
+                split = await asyncio.to_thread(self._split_documents, texts)
+            else:
+                split = self._split_documents(texts)
+            for (_, metadata), parts in zip(group, split):
+                for batch in add_document(metadata, parts):
+                    yield batch
+        
+        if documents:
+            yield documents, metadatas, ids, token_counts
+
+    def _split_documents(self, texts: List[str]) -> List[List[Tuple[str, int]]]:
+        """Parties (texte, nombre de tokens) de chaque document, découpé s'il dépasse
+        la longueur maximale acceptée par le modèle d'embedding. Les documents sont
+        tokenisés en un seul appel."""
+        split = []
+        # Jetons spéciaux ("<|endoftext|>"...) encodés comme du texte ordinaire
+        for document, tokens in zip(texts, self.tokenizer.encode_batch(texts, disallowed_special=())):
+            if len(tokens) <= self.max_input_tokens:
+                split.append([(document, len(tokens))])
+                continue
+            # Document trop long pour le modèle: le découper en fenêtres de tokens
+            windows = [tokens[k:k + self.max_input_tokens] for k in range(0, len(tokens), self.max_input_tokens)]
+            split.append([(self.tokenizer.decode(window), len(window)) for window in windows])
+        return split
+
+    def _drop_indexed(self, batch):
+        """Retire d'un lot les documents déjà présents dans la collection (même identifiant)"""
+        ids = batch[2]
+        # include=[]: ne récupérer que les identifiants, sans documents ni embeddings
+        indexed = set(self.collection.get(ids=ids, include=[])['ids'])
+        if not indexed:
+            return batch
+        logger.debug("%d documents déjà indexés ignorés", len(indexed))
+        keep = [i for i, doc_id in enumerate(ids) if doc_id not in indexed]
+        return tuple([values[i] for i in keep] for values in batch)
+
+    def _drop_stale(self, loaded_ids: set, loaded_urls: set):
+        """Supprime les anciens documents des pages qui viennent d'être chargées (contenu
+        modifié depuis le scraping précédent). Les pages absentes du chargement, en échec
+        ou hors de la limite de pages, gardent leurs documents."""
+        indexed = self.collection.get(where={'url': {'$in': list(loaded_urls)}}, include=[])['ids']
+        stale = [doc_id for doc_id in indexed if doc_id not in loaded_ids]
+        if stale:
+            logger.debug("%d documents obsolètes supprimés", len(stale))
+            self.collection.delete(ids=stale)
+
+    async def aload_pages(self, pages: AsyncIterator[Dict[str, Any]], batch_size: int = EMBED_BATCH_MAX_INPUTS) -> int:
+        """Charge des pages au fur et à mesure qu'elles arrivent, par exemple pendant le scraping.
+        Retourne le nombre de documents chargés."""
+        # Pendant le scraping, la boucle d'événements est partagée avec Playwright:
+        # tokeniser chaque page dans un thread
+        return await self._aload_documents(_apage_documents(pages), batch_size, offload=True)
+
+    async def _aload_documents(self, documents: AsyncIterator[DocumentGroup], batch_size: int, offload: bool = False) -> int:
+        """Embedde et ajoute des groupes de documents (texte, métadonnées) à la collection.
+
+        Avec l'API OpenAI, les lots sont embeddés en parallèle (au plus EMBED_MAX_IN_FLIGHT
+        requêtes en vol); un modèle local les embedde un par un. Ils sont ajoutés à la collection dans l'ordre. Chaque document a pour identifiant un hash
+        de son URL et de son contenu: ceux déjà présents dans la collection ne sont pas
+        réembeddés, et les anciennes versions des pages chargées sont supprimées.
+        Retourne le nombre de documents chargés.
+        """
+        # File des lots en cours d'embedding, dans l'ordre d'arrivée: sa taille
+        # bornée limite à la fois la concurrence et la mémoire occupée
+        pending = deque()
+        doc_count = 0
+        batch_count = 0
+        loaded_ids = set()
+        loaded_urls = set()
+        max_in_flight = EMBED_MAX_IN_FLIGHT if self._embeds_remotely else 1
+        
+        async with AsyncExitStack() as stack:
+            # Client asynchrone nécessaire uniquement pour embedder via l'API OpenAI
+            aclient = await stack.enter_async_context(self._async_openai()) if self._embeds_remotely else None
+            
+            async def add_oldest():
+                nonlocal doc_count, batch_count
+                (documents, metadatas, ids, token_counts), task = pending.popleft()
+                # Écriture ChromaDB dans un thread, comme les autres appels bloquants
+                await asyncio.to_thread(
+                    self.collection.upsert,
+                    documents=documents,
+                    embeddings=await task,
+                    metadatas=metadatas,
+                    ids=ids
+                )
+                doc_count += len(documents)
+                batch_count += 1
+                # Progression par lot: le message n'est construit que si le niveau DEBUG est actif
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Lot {batch_count} chargé ({len(documents)} documents, {sum(token_counts)} tokens)")
+            
+            try:
+                async for batch in self._iter_batches(documents, batch_size, loaded_ids, loaded_urls, offload):
+                    batch = await asyncio.to_thread(self._drop_indexed, batch)
+                    if not batch[0]:
+                        continue
+                    task = asyncio.create_task(self.embedding_function.aembed(batch[0], aclient))
+                    pending.append((batch, task))
+                    if len(pending) >= max_in_flight:
+                        await add_oldest()
+                    # Ajouter sans attendre les lots déjà embeddés (les pages peuvent arriver lentement)
+                    while pending and pending[0][1].done():
+                        await add_oldest()
+                while pending:
+                    await add_oldest()
+            finally:
+                # En cas d'erreur, ne pas laisser de requêtes orphelines
+                for _, task in pending:
+                    task.cancel()
+        
+        # Les pages rechargées ne gardent que leur contenu actuel
+        if loaded_urls:
+            await asyncio.to_thread(self._drop_stale, loaded_ids, loaded_urls)
+        return doc_count
+
+    def _async_openai(self) -> AsyncOpenAI:
+        """Client OpenAI asynchrone, à utiliser dans un `async with` au sein d'une boucle d'événements"""
+        return AsyncOpenAI(
+            api_key=self.api_key,
+            http_client=httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(proxy=None, http2=True, limits=HTTP_LIMITS),
+                timeout=HTTP_TIMEOUT
+            )
+        )
+
     def rag_query(self, query: str, n_results: int = 5, threshold: float = 0.0) -> Dict[str, Any]:
-        """Effectue une recherche RAG (Retrieval-Augmented Generation)."""
-        print(f"Recherche RAG pour: {query}")
+        """Effectue une recherche RAG (Retrieval-Augmented Generation).
+
+        Les appels OpenAI passent par le client synchrone partagé, pour réutiliser ses
+        connexions persistantes d'une question à l'autre.
+        """
+        logger.info(f"Recherche RAG pour: {query}")
         
         try:
-            # Recherche des documents pertinents
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results
-            )
-            
-            # Préparer les résultats
-            sources = []
-            for i, doc in enumerate(results['documents'][0]):
-                sources.append({
-                    'content': doc,
-                    'url': results['metadatas'][0][i].get('url', ''),
-                    'title': results['metadatas'][0][i].get('title', 'Sans titre'),
-                    'similarity': results['distances'][0][i] if 'distances' in results else 0.0
-                })
+            sources = self.retrieve(query, n_results)
             
             # Générer une réponse avec OpenAI
-            context = "\n\n".join([f"Source {i+1}: {src['content']}" for i, src in enumerate(sources)])
-            
             response = self.openai_client.chat.completions.create(
                 model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "Vous êtes un assistant précis et concis. Répondez directement à la question en vous basant uniquement sur les informations fournies. Allez droit au but sans détails superflus. Si l'information n'est pas disponible dans le contexte, dites-le simplement."},
-                    {"role": "user", "content": f"Contexte:\n{context}\n\nQuestion: {query}"}
-                ],
+                messages=self._rag_messages(query, sources),
                 temperature=0.0
             )
             
@@ -202,12 +536,78 @@ class VectorStore:
             
         except Exception as e:
             error_msg = f"Erreur lors de la recherche RAG: {str(e)}"
-            print(error_msg)
+            logger.error(error_msg)
             return {
                 'answer': f"Désolé, une erreur s'est produite lors du traitement de votre requête: {str(e)}",
                 'sources': []
             }
 
+    async def arag_query(self, query: str, n_results: int = 5, threshold: float = 0.0) -> Dict[str, Any]:
+        """Version asynchrone de `rag_query`, exécutée dans un thread pour ne pas bloquer
+        la boucle d'événements de l'appelant."""
+        return await asyncio.to_thread(self.rag_query, query, n_results, threshold)
+
+    def retrieve(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+        """Recherche les documents les plus proches de la question, sans générer de réponse."""
+        # Embedder la question une seule fois, avec le même backend que les documents,
+        # puis interroger ChromaDB directement avec le vecteur
+        results = self.collection.query(
+            query_embeddings=[self._embed_query(query)],
+            n_results=n_results
+        )
+        
+        # Préparer les résultats
+        sources = []
+        for i, doc in enumerate(results['documents'][0]):
+            sources.append({
+                'content': doc,
+                'url': results['metadatas'][0][i].get('url', ''),
+                'title': results['metadatas'][0][i].get('title', 'Sans titre'),
+                'similarity': results['distances'][0][i] if 'distances' in results else 0.0
+            })
+        return sources
+
+    def rag_query_stream(self, query: str, n_results: int = 5, sources: Optional[List[Dict[str, Any]]] = None) -> Iterator[str]:
+        """Variante de `rag_query` qui produit la réponse au fil de sa génération.
+
+        Les sources peuvent être passées si elles ont déjà été obtenues avec `retrieve`.
+        """
+        logger.info(f"Recherche RAG (streaming) pour: {query}")
+        if sources is None:
+            sources = self.retrieve(query, n_results)
+        
+        stream = self.openai_client.chat.completions.create(
+            model="gpt-4o",
+            messages=self._rag_messages(query, sources),
+            temperature=0.0,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    @staticmethod
+    def _rag_messages(query: str, sources: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        context = "\n\n".join([f"Source {i+1}: {src['content']}" for i, src in enumerate(sources)])
+        return [
+            {"role": "system", "content": "Vous êtes un assistant précis et concis. Répondez directement à la question en vous basant uniquement sur les informations fournies. Allez droit au but sans détails superflus. Si l'information n'est pas disponible dans le contexte, dites-le simplement."},
+            {"role": "user", "content": f"Contexte:\n{context}\n\nQuestion: {query}"}
+        ]
+
+    def _embed_query(self, query: str) -> List[float]:
+        """Embedding d'une question, mémorisé par texte exact (LRU)"""
+        embedding = self._query_embeddings.get(query)
+        if embedding is None:
+            # Client synchrone partagé (connexions persistantes) plutôt qu'un client
+            # asynchrone recréé à chaque question
+            embedding = self.embedding_function([query])[0]
+            self._query_embeddings[query] = embedding
+            if len(self._query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                self._query_embeddings.popitem(last=False)
+        else:
+            self._query_embeddings.move_to_end(query)
+        return embedding
+
     def get_collection_info(self) -> Dict[str, Any]:
         """Retourne des informations sur la collection actuelle."""
         try:
@@ -216,14 +616,18 @@ class VectorStore:
                 'count': self.collection.count()
             }
         except Exception as e:
-            print(f"Erreur lors de la récupération des informations de la collection: {str(e)}")
+            logger.error(f"Erreur lors de la récupération des informations de la collection: {str(e)}")
             return {'name': 'inconnu', 'count': 0}
 
+    def has_collection(self, name: str) -> bool:
+        """Indique si une collection de ce nom existe dans la base ChromaDB."""
+        return any(collection.name == name for collection in self.chroma_client.list_collections())
+
     def delete_collection(self):
         """Supprime la collection actuelle."""
         try:
             self.chroma_client.delete_collection(self.collection.name)
-            print(f"Collection {self.collection.name} supprimée avec succès")
+            logger.info(f"Collection {self.collection.name} supprimée avec succès")
         except Exception as e:
-            print(f"Erreur lors de la suppression de la collection: {str(e)}")
+            logger.error(f"Erreur lors de la suppression de la collection: {str(e)}")
             raise
\ No newline at end of file
@@ -1,15 +1,33 @@
 import os
-import json
+import orjson
 from typing import Dict, Any
 
 CONFIG_FILE = "config.json"
 
+# Dossier des fichiers de cache (scrapings sauvegardés, cache HTTP)
+CACHE_DIR = ".cache"
+
+# Dernière configuration lue, invalidée quand la date de modification du fichier change
+_cache = {'mtime': None, 'data': None}
+
+def _config_mtime():
+    try:
+        return os.stat(CONFIG_FILE).st_mtime_ns
+    except OSError:
+        return None
+
 def load_config() -> Dict[str, Any]:
     """Charge la configuration depuis le fichier config.json ou crée une configuration par défaut"""
-    if os.path.exists(CONFIG_FILE):
+    mtime = _config_mtime()
+    if mtime is not None:
+        if mtime == _cache['mtime'] and _cache['data'] is not None:
+            # Copie: les modifications de l'appelant ne doivent pas altérer le cache
+            return _cache['data'].copy()
         try:
-            with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
+            with open(CONFIG_FILE, "rb") as f:
+                config = orjson.loads(f.read())
+            _cache['mtime'], _cache['data'] = mtime, config
+            return config.copy()
         except Exception as e:
             print(f"Erreur lors du chargement de la configuration: {str(e)}")
     
@@ -19,7 +37,8 @@ def load_config() -> Dict[str, Any]:
         "max_pages": 10,
         "chunk_size": 500,
         "max_concurrent": 5,
-        "search_threshold": 0.4
+        "search_threshold": 0.4,
+        "embedding_backend": "openai"
     }
     
     # Sauvegarder la configuration par défaut
@@ -30,8 +49,9 @@ def load_config() -> Dict[str, Any]:
 def save_config(config: Dict[str, Any]) -> bool:
     """Sauvegarde la configuration dans le fichier config.json"""
     try:
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            json.dump(config, f, indent=2)
+        with open(CONFIG_FILE, "wb") as f:
+            f.write(orjson.dumps(config, option=orjson.OPT_INDENT_2))
+        _cache['mtime'], _cache['data'] = _config_mtime(), dict(config)
         return True
     except Exception as e:
         print(f"Erreur lors de la sauvegarde de la configuration: {str(e)}")
@@ -0,0 +1,61 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Any, Optional
+
+from utils.config import CACHE_DIR
+
+class HttpCache:
+    """Cache SQLite des validateurs HTTP (ETag, Last-Modified) et du dernier contenu reçu par URL.
+
+    Permet de renvoyer des requêtes conditionnelles lors d'un nouveau scraping et de
+    réutiliser le contenu en cache quand le serveur répond 304 (non modifié).
+    Les méthodes peuvent être appelées depuis des threads (asyncio.to_thread).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        path = path or os.path.join(CACHE_DIR, "http_cache.db")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Mode autocommit: chaque écriture est validée aussitôt, le verrou d'écriture
+        # n'est pas conservé pendant tout le scraping (plusieurs scrapings simultanés)
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body BLOB)"
+        )
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Retourne l'entrée en cache pour une URL, ou None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, body FROM cache WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'etag': row[0], 'last_modified': row[1], 'body': row[2]}
+
+    @staticmethod
+    def validators(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """En-têtes de requête conditionnelle correspondant à une entrée du cache"""
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str], body: bytes):
+        """Enregistre le contenu d'une URL si le serveur fournit de quoi le revalider"""
+        if not etag and not last_modified:
+            return
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache (url, etag, last_modified, body) VALUES (?, ?, ?, ?)",
+                (url, etag, last_modified, body)
+            )
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
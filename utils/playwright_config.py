@@ -3,20 +3,36 @@ import sys
 import subprocess
 import logging
 
+# Vérification faite une seule fois par processus (l'application la demande à chaque exécution)
+_browsers_ready = False
+
+def _chromium_installed() -> bool:
+    """Indique si l'exécutable Chromium attendu par la version installée de Playwright existe"""
+    from playwright.sync_api import sync_playwright
+    with sync_playwright() as p:
+        return os.path.exists(p.chromium.executable_path)
+
 def ensure_playwright_browsers():
     """Vérifie et installe les navigateurs Playwright si nécessaires"""
+    global _browsers_ready
+    if _browsers_ready:
+        return True
     try:
         logging.info("Vérification de l'installation des navigateurs Playwright...")
         # Vérifier si les navigateurs sont déjà installés
-        chrome_path = os.path.expanduser("~/.cache/ms-playwright/chromium-1097/chrome-linux/chrome")
-        if not os.path.exists(chrome_path):
+        if not _chromium_installed():
             logging.info("Installation des navigateurs Playwright...")
-            # Installer les navigateurs
-            subprocess.run([sys.executable, "-m", "playwright", "install", "chromium"], 
-                          check=True, capture_output=True)
+            # Installer les navigateurs en relayant la sortie de l'installateur au fil de l'eau
+            proc = subprocess.Popen([sys.executable, "-m", "playwright", "install", "chromium"],
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+            for line in proc.stdout:
+                logging.info(line.rstrip())
+            if proc.wait() != 0:
+                raise subprocess.CalledProcessError(proc.returncode, proc.args)
             logging.info("Installation réussie des navigateurs Playwright")
         else:
             logging.info("Les navigateurs Playwright sont déjà installés")
+        _browsers_ready = True
         return True
     except Exception as e:
         logging.error(f"Erreur lors de l'installation des navigateurs Playwright: {str(e)}")
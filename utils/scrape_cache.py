@@ -0,0 +1,54 @@
+import os
+import glob
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Dict, Any, Iterable, Tuple
+
+from utils.config import CACHE_DIR
+
+def scrape_result_path(name: str) -> str:
+    """Chemin du fichier d'un scraping sauvegardé sous ce nom"""
+    return os.path.join(CACHE_DIR, f"{name}.parquet")
+
+def save_scrape_result(documents: Iterable[Tuple[str, Dict[str, Any]]], header: Dict[str, Any], name: str) -> str:
+    """Sauvegarde les documents à indexer d'un scraping sur disque et retourne le chemin du fichier.
+
+    Le fichier est une table Parquet (compression zstd) avec une ligne par document
+    (texte, métadonnées) et les colonnes url, title, chunk_id (nul pour une page entière)
+    et text. `header`, les informations générales du site, est stocké dans les
+    métadonnées du schéma.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = scrape_result_path(name)
+    
+    urls, titles, chunk_ids, texts = [], [], [], []
+    for text, metadata in documents:
+        urls.append(metadata['url'])
+        titles.append(metadata['title'])
+        chunk_ids.append(metadata.get('chunk_id'))
+        texts.append(text)
+    
+    table = pa.table(
+        {
+            'url': pa.array(urls, pa.string()),
+            'title': pa.array(titles, pa.string()),
+            'chunk_id': pa.array(chunk_ids, pa.int32()),
+            'text': pa.array(texts, pa.string()),
+        },
+        metadata={b'scrape': orjson.dumps(header)}
+    )
+    pq.write_table(table, path, compression='zstd')
+    return path
+
+def load_scrape_table(path: str) -> pa.Table:
+    """Relit la table des documents d'un scraping sauvegardé (fichier projeté en mémoire)"""
+    return pq.read_table(path, memory_map=True)
+
+def delete_scrape_results(prefix: str):
+    """Supprime les scrapings sauvegardés sous un nom de la forme `<prefix>__<clé>`"""
+    for path in glob.glob(scrape_result_path(f"{glob.escape(prefix)}__*")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,12 @@
+import tiktoken
+
+# Encodage tiktoken des modèles d'embedding OpenAI, chargé à la première utilisation
+# et partagé par tout le processus
+_encoding = None
+
+def get_encoding():
+    """Retourne l'encodage cl100k_base commun au scraper et au vector store"""
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding